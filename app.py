@@ -1,9 +1,23 @@
 import streamlit as st
 import pandas as pd
+import polars as pl
+import duckdb
 import plotly.express as px
 import plotly.graph_objects as go
 import re
 
+# Rows sent to the browser per table; the full table is offered as a CSV download
+MAX_DISPLAY_ROWS = 500
+
+# Corrupted SKU: starts with "vof-", has 2+ hyphens, or is over 20 chars (one linear-time regex pass)
+CORRUPTED_SKU = r"(?s)^(?:vof-|[^-]*-[^-]*-|.{21,})"
+
+# pandas' default read_csv missing-value markers, so Polars nulls the same cells
+NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"
+]
+
 # -----------------------------------
 # 1. PAGE SETUP & STYLING
 # -----------------------------------
@@ -24,43 +38,111 @@ st.caption("Internal Operations Control Center")
 # -----------------------------------
 # 2. CACHED DATA ENGINE
 # -----------------------------------
-@st.cache_data
+def read_csv_fast(file, columns=None):
+    # Only parse the needed columns; headers may be padded, so match on stripped names
+    usecols = None
+    if columns is not None:
+        usecols = [c for c in pd.read_csv(file, nrows=0).columns if c.strip() in columns]
+        file.seek(0)
+
+    # Prefer the multithreaded pyarrow parser; fall back to the NumPy-backed C engine
+    try:
+        return pd.read_csv(file, engine="pyarrow", dtype_backend="pyarrow", usecols=usecols)
+    except (ImportError, ValueError):
+        file.seek(0)
+        return pd.read_csv(file, engine="c", low_memory=False, cache_dates=True, usecols=usecols)
+
+# Persisted to disk so parsed uploads survive restarts; max_entries bounds disk use
+@st.cache_data(persist="disk", max_entries=4)
 def process_data(inv_file, sales_file):
-    inv = pd.read_csv(inv_file)
-    sales = pd.read_csv(sales_file)
-    
+    inv = read_csv_fast(inv_file, columns=["Sku Code", "Available (ATP)"])
     inv.columns = inv.columns.str.strip()
-    sales.columns = sales.columns.str.strip()
+
+    # Sales cleanup runs as one lazy, multithreaded Polars query. Every column is read
+    # as text: schema inference only samples the first rows, and a late non-numeric
+    # Order ID, decimal price or bad timestamp would otherwise abort the scan
+    sales = pl.scan_csv(sales_file, infer_schema=False, null_values=NA_VALUES)
+    sales = sales.rename({c: c.strip() for c in sales.collect_schema().names()})
+    sales_cols = sales.collect_schema().names()
 
     # Find Order ID
     possible_order_cols = ["Order #", "Order Number", "Order ID", "Order Code"]
-    order_id_col = next((c for c in possible_order_cols if c in sales.columns), "Order #")
+    order_id_col = next((c for c in possible_order_cols if c in sales_cols), "Order #")
+    status_col = "Order Status" if "Order Status" in sales_cols else "Status"
+
+    # Project to the used columns; the lazy scan then skips parsing the rest
+    sales = sales.select(order_id_col, "Uniware Created At", "Seller SKUs", "Products", "Order Price", "Channel", status_col)
+
+    # SKU Cleanup (Logics preserved): split, explode, corrupted SKU -> Products
+    sku = pl.col("Seller SKUs")
+    is_corrupted = sku.str.contains(CORRUPTED_SKU)
+    sales = (
+        sales
+        # Blank cells stay null: the rows count in the KPIs but not in SKU aggregates
+        .with_columns(sku.str.replace_all("|", ",", literal=True).str.split(","))
+        .explode("Seller SKUs")
+        .with_columns(sku.str.strip_chars())
+        .with_columns(
+            pl.when(is_corrupted).then(pl.col("Products").str.strip_chars()).otherwise(sku).alias("Final SKU"),
+            pl.col(status_col).str.to_uppercase(),
+            # Order Price is read as text; non-strict cast turns unparseable prices into null,
+            # and null/NaN prices become 0 like to_numeric(errors="coerce").fillna(0)
+            pl.col("Order Price").str.strip_chars().cast(pl.Float64, strict=False).fill_nan(0).fill_null(0)
+        )
+        .filter(pl.col("Final SKU").ne_missing(""))
+        .collect()
+        .to_pandas(use_pyarrow_extension_array=True)
+    )
 
     # Date Processing
     sales["Uniware Created At"] = pd.to_datetime(sales["Uniware Created At"], errors="coerce")
-    
-    # SKU Cleanup (Logics preserved)
-    sales["Seller SKUs"] = sales["Seller SKUs"].astype(str).str.replace("|", ",", regex=False).str.split(",")
-    sales = sales.explode("Seller SKUs")
-    sales["Seller SKUs"] = sales["Seller SKUs"].astype(str).str.strip()
-
-    def is_corrupted_sku(sku):
-        sku = str(sku)
-        return sku.startswith("vof-") or sku.count("-") > 1 or len(sku) > 20
-
-    sales["Final SKU"] = sales.apply(
-        lambda x: x["Products"] if is_corrupted_sku(x["Seller SKUs"]) else x["Seller SKUs"],
-        axis=1
-    )
-    sales["Final SKU"] = sales["Final SKU"].astype(str).str.strip()
-    sales = sales[sales["Final SKU"] != ""]
+    sales["Order Date"] = sales["Uniware Created At"].dt.floor("D")
 
-    # Status Processing
-    status_col = "Order Status" if "Order Status" in sales.columns else "Status"
-    sales[status_col] = sales[status_col].astype(str).str.upper()
+    # Group keys as categoricals: groupby/pivot walk integer codes
+    for c in ("Channel", "Final SKU"):
+        sales[c] = sales[c].astype("category")
 
     return inv, sales, order_id_col, status_col
 
+def query(df, sql):
+    # DuckDB scans the frame in place as table "s" with a multithreaded hash aggregate
+    with duckdb.connect() as con:
+        con.register("s", df)
+        return con.sql(sql).df()
+
+# Per-view aggregates, cached so widget reruns don't redo the groupbys
+@st.cache_data
+def sku_agg(df):
+    return query(df, """
+        SELECT "Final SKU"::VARCHAR AS "Final SKU", COUNT(*) AS Total_Units, SUM("Order Price") AS Total_Revenue
+        FROM s WHERE "Final SKU" IS NOT NULL GROUP BY 1
+    """).set_index("Final SKU")
+
+@st.cache_data
+def channel_agg(df):
+    return query(df, """
+        SELECT Channel::VARCHAR AS Channel, COUNT(*) AS n
+        FROM s WHERE Channel IS NOT NULL GROUP BY 1 ORDER BY 1
+    """).set_index("Channel")["n"]
+
+@st.cache_data
+def daily_channel_agg(df):
+    # Rows without a Channel stay in the daily totals as a NULL group
+    return query(df, """
+        SELECT "Order Date", Channel::VARCHAR AS Channel, COUNT(*) AS units, SUM("Order Price") AS revenue
+        FROM s WHERE "Order Date" IS NOT NULL GROUP BY 1, 2 ORDER BY 1, 2
+    """).set_index(["Order Date", "Channel"])
+
+@st.cache_data
+def daily_totals(daily):
+    # Keyed on the small date x channel frame, so the hash is cheap
+    return daily.groupby(level="Order Date").sum()
+
+@st.cache_data
+def to_csv_bytes(df):
+    # Download payloads are encoded once per table, not on every widget rerun
+    return df.to_csv(index=False).encode()
+
 # -----------------------------------
 # 3. FILE UPLOAD & EXECUTION
 # -----------------------------------
@@ -72,9 +154,12 @@ if inv_file and sales_file:
     inv, sales, order_id_col, status_col = process_data(inv_file, sales_file)
 
     # Filtered Datasets
-    cancelled_orders = sales[sales[status_col].str.contains("CANCEL", na=False)].copy()
-    completed_sales = sales[~sales[status_col].str.contains("CANCEL", na=False)].copy()
-    completed_sales["Order Price"] = pd.to_numeric(completed_sales["Order Price"], errors="coerce").fillna(0)
+    is_cancel = sales[status_col].str.contains("CANCEL", na=False, regex=False)
+    cancelled_orders = sales[is_cancel]
+    completed_sales = sales[~is_cancel]
+
+    # One SKU aggregate shared by every tab
+    sku_stats = sku_agg(completed_sales)
 
     # -----------------------------------
     # 4. BUSINESS OVERVIEW (KPIs)
@@ -93,7 +178,7 @@ if inv_file and sales_file:
     tab1, tab2, tab3, tab4 = st.tabs(["📦 Inventory Health", "🛒 Sales Performance", "❌ Cancel Report", "📈 Analytics"])
 
     with tab1:
-        sku_sales = completed_sales.groupby("Final SKU").size().reset_index(name="Total Sold")
+        sku_sales = sku_stats["Total_Units"].reset_index(name="Total Sold")
         inventory = inv[["Sku Code", "Available (ATP)"]].rename(columns={"Sku Code": "SKU"})
         
         # Merge Logic
@@ -119,7 +204,7 @@ if inv_file and sales_file:
         c_sales1, c_sales2 = st.columns(2)
         
         with c_sales1:
-            channel_data = completed_sales.groupby("Channel").size().reset_index(name="Units")
+            channel_data = channel_agg(completed_sales).reset_index(name="Units")
             fig_chan = px.pie(
                 channel_data, 
                 values="Units", 
@@ -150,17 +235,14 @@ if inv_file and sales_file:
         st.subheader("📋 Detailed SKU Sales Quantities")
         
         # We can also add Revenue here since it's helpful
-        sku_qty_val = completed_sales.groupby("Final SKU").agg(
-            Total_Units=('Final SKU', 'count'),
-            Total_Revenue=('Order Price', 'sum')
-        ).sort_values("Total_Units", ascending=False).reset_index()
+        sku_qty_val = sku_stats.sort_values("Total_Units", ascending=False).reset_index()
         
         # Rename for clarity
         sku_qty_val.rename(columns={"Final SKU": "Sku Code", "Total_Units": "Quantity Sold"}, inplace=True)
 
         # Using st.dataframe allows the user to search (Ctrl+F) and sort easily
         st.dataframe(
-            sku_qty_val,
+            sku_qty_val.head(MAX_DISPLAY_ROWS),
             use_container_width=True,
             column_config={
                 "Quantity Sold": st.column_config.NumberColumn("Quantity Sold", help="Total units sold across all channels"),
@@ -169,16 +251,22 @@ if inv_file and sales_file:
             },
             hide_index=True
         )
+        st.download_button("⬇️ Full SKU CSV", to_csv_bytes(sku_qty_val), "sku_sales.csv", "text/csv")
 
         # 3. Channel Breakdown Table
         with st.expander("View Unit Sales per Channel"):
-            channel_units = completed_sales.groupby("Channel").size().reset_index(name="Units Sold").sort_values("Units Sold", ascending=False)
+            channel_units = channel_agg(completed_sales).reset_index(name="Units Sold").sort_values("Units Sold", ascending=False)
             st.table(channel_units)
 
     with tab3:
         st.markdown("### ❌ Cancellation Breakdown")
-        cancelled_sku_channel = cancelled_orders.pivot_table(index="Final SKU", columns="Channel", aggfunc="size", fill_value=0)
-        st.dataframe(cancelled_sku_channel.style.background_gradient(cmap="Reds"), use_container_width=True)
+        cancelled_sku_channel = query(cancelled_orders, """
+            SELECT "Final SKU"::VARCHAR AS "Final SKU", Channel::VARCHAR AS Channel, COUNT(*) AS n
+            FROM s WHERE "Final SKU" IS NOT NULL AND Channel IS NOT NULL GROUP BY 1, 2
+        """).set_index(["Final SKU", "Channel"])["n"].unstack(fill_value=0)
+        # Heatmap instead of a Styler gradient: no per-cell CSS, scales to thousands of SKUs
+        fig_cancel = px.imshow(cancelled_sku_channel, color_continuous_scale="Reds", aspect="auto", labels={"color": "Cancelled"})
+        st.plotly_chart(fig_cancel, use_container_width=True)
 
     # =====================================================
     # 📊 ANALYSIS TAB (UPDATED)
@@ -193,22 +281,28 @@ if inv_file and sales_file:
             default="Sale Units"
         )
 
-        completed_sales["Order Date"] = completed_sales["Uniware Created At"].dt.date
+        # Both daily series are computed once; the selector only picks which one to plot
+        daily = daily_channel_agg(completed_sales)
+        totals = daily_totals(daily)
+        daily_units, daily_rev = totals["units"], totals["revenue"]
         
         # Prepare Chart Data
-        if metric_choice == "Sale Units":
-            daily_plot = completed_sales.groupby("Order Date").size()
-        else:
-            daily_plot = completed_sales.groupby("Order Date")["Order Price"].sum()
+        daily_plot = daily_units if metric_choice == "Sale Units" else daily_rev
+
+        # One point per calendar day (days without sales plot as zero) bounds the trace size
+        daily_plot = daily_plot.set_axis(pd.DatetimeIndex(daily_plot.index)).resample("D").sum()
 
         # Visual Chart
-        fig_trend = px.area(daily_plot, title=f"Daily Trend: {metric_choice}", color_discrete_sequence=['#007bff'])
+        # px.area has no WebGL mode; a filled scattergl line renders the same area on the GPU
+        fig_trend = px.line(daily_plot, title=f"Daily Trend: {metric_choice}", color_discrete_sequence=['#007bff'], render_mode="webgl")
+        fig_trend.update_traces(fill="tozeroy")
+        fig_trend.update_layout(hovermode="x", spikedistance=-1)
         st.plotly_chart(fig_trend, use_container_width=True)
 
         # 2. Daily Averages Section
         st.markdown("### 📊 Key Performance Averages")
-        avg_units = completed_sales.groupby("Order Date").size().mean()
-        avg_price = completed_sales.groupby("Order Date")["Order Price"].sum().mean()
+        avg_units = daily_units.mean()
+        avg_price = daily_rev.mean()
         # Average Order Value (AOV) = Total Revenue / Number of Unique Orders
         total_rev_sum = completed_sales["Order Price"].sum()
         unique_order_count = completed_sales[order_id_col].nunique()
@@ -223,38 +317,33 @@ if inv_file and sales_file:
         st.markdown("---")
         st.subheader("📋 Daily Sales Data by Channel")
         
-        # Create a detailed pivot table for Channel x Date
-        daily_channel_table = completed_sales.pivot_table(
-            index="Order Date",
-            columns="Channel",
-            aggfunc="size",
-            fill_value=0
-        )
+        # Create a detailed pivot table for Channel x Date (rows without a Channel are left out,
+        # so Total Units always equals the sum of the channel columns)
+        daily_channel_table = daily["units"][daily.index.get_level_values("Channel").notna()].unstack(fill_value=0)
         
         # Add Total Units and Total Revenue columns
         daily_channel_table["Total Units"] = daily_channel_table.sum(axis=1)
-        daily_rev = completed_sales.groupby("Order Date")["Order Price"].sum()
         daily_channel_table["Total Revenue (₹)"] = daily_rev
 
         # Style the table for readability
+        daily_channel_table = daily_channel_table.sort_index(ascending=False).reset_index()
         st.dataframe(
-            daily_channel_table.sort_index(ascending=False).reset_index(),
+            daily_channel_table.head(MAX_DISPLAY_ROWS),
             use_container_width=True,
             column_config={
                 "Total Revenue (₹)": st.column_config.NumberColumn(format="₹%d"),
                 "Order Date": st.column_config.DateColumn("Date")
             }
         )
+        st.download_button("⬇️ Full Daily CSV", to_csv_bytes(daily_channel_table), "daily_sales.csv", "text/csv")
 
         # 4. SKU Performance Table (Values)
         st.subheader("📄 SKU Value Contribution")
-        sku_value_table = completed_sales.groupby("Final SKU").agg(
-            Units_Sold=('Final SKU', 'count'),
-            Total_Revenue=('Order Price', 'sum')
-        ).sort_values("Total_Revenue", ascending=False).reset_index()
+        sku_value_table = sku_stats.rename(columns={"Total_Units": "Units_Sold"}).sort_values("Total_Revenue", ascending=False).reset_index()
         
-        st.dataframe(sku_value_table, use_container_width=True, column_config={
+        st.dataframe(sku_value_table.head(MAX_DISPLAY_ROWS), use_container_width=True, column_config={
             "Total_Revenue": st.column_config.NumberColumn(format="₹%d")
         })
+        st.download_button("⬇️ Full SKU Value CSV", to_csv_bytes(sku_value_table), "sku_value.csv", "text/csv")
 else:
     st.info("💡 Please upload both UNIWARE files to unlock the dashboard.")
\ No newline at end of file